@@ -0,0 +1,84 @@
+"""Mide el impacto de los respaldos en línea sobre la latencia de agregar_gasto.
+
+Uso: python benchmark_backup.py [filas] [escrituras]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from bot import AdvancedExpenseBot
+
+
+def poblar(bot, filas):
+    """Llena la base con gastos de prueba para que el respaldo tenga páginas que copiar"""
+    conn = sqlite3.connect(bot.db_path)
+    conn.executemany(
+        'INSERT INTO gastos (user_id, categoria, monto, descripcion) VALUES (?, ?, ?, ?)',
+        ((i % 500, 'alimentacion', 1000 + i, f"gasto de prueba {i} " + "x" * 80) for i in range(filas))
+    )
+    conn.commit()
+    conn.close()
+
+
+def medir_escrituras(bot, escrituras):
+    """Devuelve las latencias en milisegundos de cada llamada a agregar_gasto"""
+    latencias = []
+    for i in range(escrituras):
+        inicio = time.perf_counter()
+        bot.agregar_gasto(1, 'transporte', 2000, f"bus {i}")
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.002)
+    return latencias
+
+
+def medir_con_backup(bot, escrituras, directorio, paginas_por_paso):
+    """Mide escrituras mientras un hilo crea respaldos de forma continua"""
+    detener = threading.Event()
+    respaldos = []
+
+    def respaldar():
+        while not detener.is_set():
+            respaldos.append(bot.crear_backup(directorio, max_backups=2, paginas_por_paso=paginas_por_paso))
+
+    hilo = threading.Thread(target=respaldar)
+    hilo.start()
+    try:
+        latencias = medir_escrituras(bot, escrituras)
+    finally:
+        detener.set()
+        hilo.join()
+    return latencias, len(respaldos)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def reportar(nombre, latencias, respaldos=None):
+    linea = f"{nombre:<28} p50={percentil(latencias, 50):7.2f}ms  p99={percentil(latencias, 99):7.2f}ms  max={max(latencias):7.2f}ms"
+    if respaldos is not None:
+        linea += f"  respaldos={respaldos}"
+    print(linea)
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    escrituras = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = AdvancedExpenseBot(os.path.join(tmp, 'bench.db'))
+        poblar(bot, filas)
+        directorio = os.path.join(tmp, 'backups')
+
+        print(f"Base: {os.path.getsize(bot.db_path) / 1024 / 1024:.1f} MB, {escrituras} escrituras por escenario\n")
+        reportar("sin respaldo", medir_escrituras(bot, escrituras))
+        reportar("respaldo por pasos (64 pág)", *medir_con_backup(bot, escrituras, directorio, 64))
+        reportar("respaldo de un solo paso", *medir_con_backup(bot, escrituras, directorio, -1))
+
+
+if __name__ == '__main__':
+    main()
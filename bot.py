@@ -4,8 +4,16 @@ from datetime import datetime, timedelta, date
 import csv
 import io
 import calendar
+import math
 import os
+import asyncio
+import glob
+import gzip
+import shutil
+import time
+from collections import OrderedDict
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
 # Configuración de logging
@@ -30,9 +38,32 @@ CATEGORIAS = {
     'otros': '📝 Otros'
 }
 
+class RestauracionCanceladaError(Exception):
+    """No se pudo crear el respaldo previo, así que no se restauró nada"""
+
+# Configuración de respaldos
+ADMIN_ID = os.environ.get('ADMIN_ID')
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+BACKUP_MAX = int(os.environ.get('BACKUP_MAX', 7))
+BACKUP_INTERVALO_HORAS = int(os.environ.get('BACKUP_INTERVALO_HORAS', 24))
+BACKUP_PAGINAS_POR_PASO = 64
+BACKUP_PAUSA_SEGUNDOS = 0.05
+
+# Reportes paginados (Telegram admite hasta 4096 caracteres por mensaje)
+LIMITE_PAGINA = 3500
+MAX_REPORTES_CACHE = 1000
+MAX_VERSIONES = 10000
+
 class AdvancedExpenseBot:
     def __init__(self, db_path='gastos_avanzado.db'):
         self.db_path = db_path
+        # Versiones de datos por usuario para invalidar reportes cacheados.
+        # Salen de un contador global; al desalojar a un usuario poco activo
+        # se recuerda la mayor versión desalojada para no revivir cachés viejas
+        self.versiones = OrderedDict()
+        self.contador_versiones = 0
+        self.version_desalojada = 0
+        self.generacion = 0
         self.init_db()
     
     def init_db(self):
@@ -40,6 +71,9 @@ class AdvancedExpenseBot:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL permite que los respaldos lean sin bloquear a los escritores
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Tabla de gastos
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS gastos (
@@ -98,6 +132,21 @@ class AdvancedExpenseBot:
         
         conn.commit()
         conn.close()
+    
+    def _registrar_cambio(self, user_id):
+        """Incrementa la versión de datos del usuario tras una escritura"""
+        self.contador_versiones += 1
+        self.versiones[user_id] = self.contador_versiones
+        self.versiones.move_to_end(user_id)
+        if len(self.versiones) > MAX_VERSIONES:
+            _, version = self.versiones.popitem(last=False)
+            self.version_desalojada = max(self.version_desalojada, version)
+    
+    def version_datos(self, user_id):
+        """Devuelve la versión actual de los datos del usuario para el mes en curso"""
+        hoy = date.today()
+        version = self.versiones.get(user_id, self.version_desalojada)
+        return (self.generacion, version, hoy.year, hoy.month)
         
     def establecer_presupuesto_mensual(self, user_id, monto):
         """Establece el presupuesto general del mes"""
@@ -115,6 +164,7 @@ class AdvancedExpenseBot:
     
         conn.commit()
         conn.close()
+        self._registrar_cambio(user_id)
     
     def obtener_presupuesto_mensual(self, user_id):
         """Obtiene el presupuesto mensual general"""
@@ -151,6 +201,7 @@ class AdvancedExpenseBot:
         
         conn.commit()
         conn.close()
+        self._registrar_cambio(user_id)
         
     def crear_gasto_recurrente(self, user_id, categoria, descripcion, monto, dia_del_mes):
         """Crea un gasto recurrente"""
@@ -164,6 +215,7 @@ class AdvancedExpenseBot:
         gasto_id = cursor.lastrowid  # Obtener el ID antes de cerrar
         conn.commit()
         conn.close()
+        self._registrar_cambio(user_id)
         return gasto_id
     
     def obtener_gastos_recurrentes(self, user_id):
@@ -225,6 +277,8 @@ class AdvancedExpenseBot:
         
         conn.commit()
         conn.close()
+        if gastos_procesados:
+            self._registrar_cambio(user_id)
         return gastos_procesados
     
     def obtener_resumen_por_categoria(self, user_id):
@@ -367,9 +421,122 @@ class AdvancedExpenseBot:
         
         conn.commit()
         conn.close()
+        self._registrar_cambio(user_id)
+    
+    def agregar_gastos(self, user_id, gastos):
+        """Agrega varios gastos (categoría, monto, descripción) en una sola transacción"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO gastos (user_id, categoria, monto, descripcion)
+            VALUES (?, ?, ?, ?)
+        ''', [(user_id, categoria, monto, descripcion) for categoria, monto, descripcion in gastos])
+        
+        conn.commit()
+        conn.close()
+        self._registrar_cambio(user_id)
+    
+    def _verificar_integridad(self, conn):
+        """Ejecuta PRAGMA integrity_check sobre una conexión"""
+        resultado = conn.execute('PRAGMA integrity_check').fetchone()
+        return resultado is not None and resultado[0] == 'ok'
+    
+    def listar_backups(self, directorio=BACKUP_DIR):
+        """Lista los respaldos disponibles, del más reciente al más antiguo"""
+        rutas = glob.glob(os.path.join(directorio, 'gastos_*.db.gz'))
+        return sorted((os.path.basename(ruta) for ruta in rutas), reverse=True)
+    
+    def _pausa_backup(self, estado, restantes, total):
+        """Pausa entre pasos del backup para ceder la base a los escritores"""
+        if restantes:
+            time.sleep(BACKUP_PAUSA_SEGUNDOS)
+    
+    def crear_backup(self, directorio=BACKUP_DIR, max_backups=BACKUP_MAX, paginas_por_paso=BACKUP_PAGINAS_POR_PASO):
+        """Crea un respaldo comprimido con la API de backup en línea de SQLite"""
+        os.makedirs(directorio, exist_ok=True)
+        marca = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        ruta_temporal = os.path.join(directorio, f'gastos_{marca}.db.tmp')
+        ruta_final = os.path.join(directorio, f'gastos_{marca}.db.gz')
+        
+        try:
+            origen = sqlite3.connect(self.db_path)
+            destino = sqlite3.connect(ruta_temporal)
+            try:
+                # Una transacción de lectura abierta fija la instantánea: con WAL
+                # los escritores siguen trabajando y la copia no se reinicia
+                origen.execute('BEGIN')
+                origen.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                
+                # Copia en pasos pequeños con una pausa entre pasos
+                # para que agregar_gasto no tenga que esperar
+                origen.backup(destino, pages=paginas_por_paso, progress=self._pausa_backup)
+                if not self._verificar_integridad(destino):
+                    raise sqlite3.DatabaseError("El respaldo no pasó la verificación de integridad")
+            finally:
+                destino.close()
+                origen.close()
+            
+            with open(ruta_temporal, 'rb') as archivo_origen, gzip.open(ruta_final, 'wb') as archivo_destino:
+                shutil.copyfileobj(archivo_origen, archivo_destino)
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+        
+        # Rotar: conservar solo los respaldos más recientes
+        for nombre in self.listar_backups(directorio)[max_backups:]:
+            os.remove(os.path.join(directorio, nombre))
+        
+        return ruta_final
+    
+    def restaurar_backup(self, nombre, directorio=BACKUP_DIR):
+        """Restaura la base de datos desde un respaldo comprimido.
+        
+        Antes de sobrescribir la base crea un respaldo previo para poder deshacer
+        la restauración y devuelve su ruta. Si ese respaldo falla, no restaura.
+        """
+        if os.path.basename(nombre) != nombre or nombre not in self.listar_backups(directorio):
+            raise FileNotFoundError(f"No existe el respaldo {nombre}")
+        
+        ruta_temporal = os.path.join(directorio, nombre[:-len('.gz')] + '.restore')
+        try:
+            with gzip.open(os.path.join(directorio, nombre), 'rb') as archivo_origen, open(ruta_temporal, 'wb') as archivo_destino:
+                shutil.copyfileobj(archivo_origen, archivo_destino)
+            
+            origen = sqlite3.connect(ruta_temporal)
+            try:
+                if not self._verificar_integridad(origen):
+                    raise sqlite3.DatabaseError(f"El respaldo {nombre} está corrupto")
+                
+                # El respaldo pedido ya está descomprimido, así que la rotación
+                # del respaldo previo puede borrar el original sin problema
+                try:
+                    respaldo_previo = self.crear_backup(directorio)
+                except (sqlite3.Error, OSError) as e:
+                    raise RestauracionCanceladaError(str(e)) from e
+                
+                destino = sqlite3.connect(self.db_path)
+                try:
+                    # Copia completa en un solo paso para que la restauración sea atómica
+                    origen.backup(destino)
+                finally:
+                    destino.close()
+                # Todos los reportes cacheados quedan obsoletos
+                self.generacion += 1
+            finally:
+                origen.close()
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+        
+        return respaldo_previo
 
 # Instancia del bot
-expense_bot = AdvancedExpenseBot()
+expense_bot = AdvancedExpenseBot(os.environ.get('DB_PATH', 'gastos_avanzado.db'))
+
+def es_admin(user_id):
+    """Indica si el usuario puede administrar respaldos"""
+    return ADMIN_ID is not None and str(user_id) == ADMIN_ID
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Comando /start con procesamiento automático de recurrentes"""
@@ -423,42 +590,66 @@ async def configurar_presupuesto_categoria(update: Update, context: ContextTypes
         reply_markup=reply_markup
     )
 
-async def gestionar_gastos_recurrentes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Gestionar gastos recurrentes"""
-    user_id = update.effective_user.id
-    gastos = expense_bot.obtener_gastos_recurrentes(user_id)
+def paginar(bloques, encabezado='', pie='', limite=LIMITE_PAGINA):
+    """Agrupa bloques de texto en páginas que no superan el límite de caracteres"""
+    espacio = limite - len(encabezado)
+    trozos = []
+    for bloque in bloques + ([pie] if pie else []):
+        # Un bloque demasiado largo se corta para que quepa en una página
+        trozos.extend(bloque[i:i + espacio] for i in range(0, len(bloque), espacio))
     
-    mensaje = "Gastos Recurrentes Activos:\n\n"
+    paginas = []
+    actual = []
+    largo = 0
+    for trozo in trozos:
+        if actual and largo + len(trozo) > espacio:
+            paginas.append(encabezado + ''.join(actual))
+            actual = []
+            largo = 0
+        actual.append(trozo)
+        largo += len(trozo)
+    paginas.append(encabezado + ''.join(actual))
     
-    if gastos:
-        for gasto_id, categoria, descripcion, monto, dia, ultimo_proc in gastos:
-            emoji = CATEGORIAS.get(categoria, categoria)
-            mensaje += f"{emoji}\n"
-            mensaje += f"📝 {descripcion}\n"
-            mensaje += f"💰 ${monto:,.0f} cada día {dia}\n"
-            if ultimo_proc:
-                mensaje += f"📅 Último: {ultimo_proc}\n"
-            mensaje += f"🆔 ID: {gasto_id}\n\n"
-    else:
-        mensaje += "No tienes gastos recurrentes configurados.\n\n"
+    if len(paginas) > 1:
+        paginas = [f"{pagina.rstrip()}\n\n📄 Página {i}/{len(paginas)}" for i, pagina in enumerate(paginas, 1)]
+    return paginas
+
+def renderizar_recurrentes(user_id):
+    """Genera las páginas del listado de gastos recurrentes"""
+    gastos = expense_bot.obtener_gastos_recurrentes(user_id)
     
-    mensaje += "Comandos:\n"
-    mensaje += "• /nuevo_recurrente - Crear gasto recurrente\n"
-    mensaje += "• /eliminar_recurrente <id> - Eliminar recurrente"
+    bloques = []
+    for gasto_id, categoria, descripcion, monto, dia, ultimo_proc in gastos:
+        emoji = CATEGORIAS.get(categoria, categoria)
+        lineas = [
+            f"{emoji}\n",
+            f"📝 {descripcion}\n",
+            f"💰 ${monto:,.0f} cada día {dia}\n",
+        ]
+        if ultimo_proc:
+            lineas.append(f"📅 Último: {ultimo_proc}\n")
+        lineas.append(f"🆔 ID: {gasto_id}\n\n")
+        bloques.append(''.join(lineas))
     
-    await update.message.reply_text(mensaje)
+    if not gastos:
+        bloques.append("No tienes gastos recurrentes configurados.\n\n")
+    
+    pie = (
+        "Comandos:\n"
+        "• /nuevo_recurrente - Crear gasto recurrente\n"
+        "• /eliminar_recurrente <id> - Eliminar recurrente"
+    )
+    return paginar(bloques, "Gastos Recurrentes Activos:\n\n", pie)
 
-async def estado_detallado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
+def renderizar_estado_detallado(user_id):
+    """Genera las páginas del estado detallado por categoría"""
     resumen_categorias = expense_bot.obtener_resumen_por_categoria(user_id)
     presupuesto_general = expense_bot.obtener_presupuesto_mensual(user_id)
     
     if not resumen_categorias and not presupuesto_general:
-        await update.message.reply_text("No hay presupuestos configurados.")
-        return
-    
-    mensaje = "ESTADO DETALLADO POR CATEGORÍA\n\n"
+        return ["No hay presupuestos configurados."]
     
+    bloques = []
     total_presupuesto_categorias = 0
     total_gastado = 0
     
@@ -470,30 +661,106 @@ async def estado_detallado(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         elif datos['porcentaje'] > 80:
             estado = " ALERTA"
         
-        mensaje += f"{emoji}{estado}\n"
-        mensaje += f"Gastado: ${datos['gastado']:,.0f} ({datos['porcentaje']:.1f}%)\n"
-        mensaje += f"Presupuesto: ${datos['presupuesto']:,.0f}\n"
-        mensaje += f"Saldo: ${datos['saldo']:,.0f}\n\n"
+        bloques.append(
+            f"{emoji}{estado}\n"
+            f"Gastado: ${datos['gastado']:,.0f} ({datos['porcentaje']:.1f}%)\n"
+            f"Presupuesto: ${datos['presupuesto']:,.0f}\n"
+            f"Saldo: ${datos['saldo']:,.0f}\n\n"
+        )
         
         total_presupuesto_categorias += datos['presupuesto']
         total_gastado += datos['gastado']
     
-    mensaje += f"RESUMEN GENERAL\n"
-    mensaje += f"Total categorías: ${total_presupuesto_categorias:,.0f}\n"
+    pie = [
+        "RESUMEN GENERAL\n",
+        f"Total categorías: ${total_presupuesto_categorias:,.0f}\n",
+    ]
     
     if presupuesto_general:
-        mensaje += f"Límite general: ${presupuesto_general:,.0f}\n"
-        mensaje += f"Total gastado: ${total_gastado:,.0f}\n"
-        mensaje += f"Saldo disponible: ${presupuesto_general - total_gastado:,.0f}\n"
+        pie.append(f"Límite general: ${presupuesto_general:,.0f}\n")
+        pie.append(f"Total gastado: ${total_gastado:,.0f}\n")
+        pie.append(f"Saldo disponible: ${presupuesto_general - total_gastado:,.0f}\n")
         
         porcentaje_limite = (total_gastado / presupuesto_general * 100) if presupuesto_general > 0 else 0
         
         if porcentaje_limite > 100:
-            mensaje += f"\nALERTA: Has excedido tu límite general por ${total_gastado - presupuesto_general:,.0f}"
+            pie.append(f"\nALERTA: Has excedido tu límite general por ${total_gastado - presupuesto_general:,.0f}")
         elif porcentaje_limite > 80:
-            mensaje += f"\nADVERTENCIA: Has usado {porcentaje_limite:.1f}% de tu límite general"
+            pie.append(f"\nADVERTENCIA: Has usado {porcentaje_limite:.1f}% de tu límite general")
     
-    await update.message.reply_text(mensaje)
+    return paginar(bloques, "ESTADO DETALLADO POR CATEGORÍA\n\n", ''.join(pie))
+
+# Reportes paginables: nombre usado en callback_data -> función que los genera
+RENDERIZADORES = {
+    'estado': renderizar_estado_detallado,
+    'recurrentes': renderizar_recurrentes,
+}
+
+# Páginas ya generadas (LRU): (user_id, reporte) -> (versión de datos, páginas)
+cache_reportes = OrderedDict()
+
+def obtener_paginas(user_id, reporte):
+    """Devuelve las páginas de un reporte, generándolas solo si los datos cambiaron"""
+    version = expense_bot.version_datos(user_id)
+    clave = (user_id, reporte)
+    cacheado = cache_reportes.get(clave)
+    if cacheado and cacheado[0] == version:
+        cache_reportes.move_to_end(clave)
+        return cacheado[1]
+    
+    if cacheado:
+        # Los datos cambiaron: descartar todos los reportes viejos del usuario
+        for nombre in RENDERIZADORES:
+            cache_reportes.pop((user_id, nombre), None)
+    
+    paginas = RENDERIZADORES[reporte](user_id)
+    cache_reportes[clave] = (version, paginas)
+    while len(cache_reportes) > MAX_REPORTES_CACHE:
+        cache_reportes.popitem(last=False)
+    return paginas
+
+def teclado_paginas(reporte, pagina, total):
+    """Botones de navegación anterior/siguiente para un reporte paginado"""
+    if total <= 1:
+        return None
+    
+    botones = []
+    if pagina > 0:
+        botones.append(InlineKeyboardButton("◀️ Anterior", callback_data=f'pag_{reporte}_{pagina - 1}'))
+    if pagina < total - 1:
+        botones.append(InlineKeyboardButton("Siguiente ▶️", callback_data=f'pag_{reporte}_{pagina + 1}'))
+    return InlineKeyboardMarkup([botones])
+
+async def enviar_reporte(update: Update, reporte) -> None:
+    """Envía la primera página de un reporte"""
+    paginas = obtener_paginas(update.effective_user.id, reporte)
+    await update.message.reply_text(paginas[0], reply_markup=teclado_paginas(reporte, 0, len(paginas)))
+
+async def callback_pagina(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Maneja los botones de paginación de reportes"""
+    query = update.callback_query
+    await query.answer()
+    
+    _, reporte, pagina = query.data.split('_')
+    if reporte not in RENDERIZADORES:
+        return
+    
+    paginas = obtener_paginas(query.from_user.id, reporte)
+    pagina = min(int(pagina), len(paginas) - 1)
+    
+    try:
+        await query.edit_message_text(paginas[pagina], reply_markup=teclado_paginas(reporte, pagina, len(paginas)))
+    except BadRequest as e:
+        # Dos toques rápidos al mismo botón piden la página que ya se muestra
+        if 'not modified' not in str(e).lower():
+            raise
+
+async def gestionar_gastos_recurrentes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gestionar gastos recurrentes"""
+    await enviar_reporte(update, 'recurrentes')
+
+async def estado_detallado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await enviar_reporte(update, 'estado')
 
 async def analisis_tendencias(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Análisis de tendencias y proyecciones"""
@@ -563,7 +830,10 @@ async def callback_categoria(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"Has seleccionado: {CATEGORIAS[categoria]}\n\n"
         "Ahora envía el monto y descripción del gasto.\n"
         "Formato: monto descripción\n"
-        "Ejemplo: 50000 hamburguesa"
+        "Ejemplo: 50000 hamburguesa\n\n"
+        "Puedes enviar varios gastos, uno por línea, e indicar otra categoría al inicio:\n"
+        "50000 hamburguesa\n"
+        "transporte 2000 bus"
     )
 
 async def callback_presupuesto_categoria(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -580,39 +850,100 @@ async def callback_presupuesto_categoria(update: Update, context: ContextTypes.D
         "Ejemplo: 1500"
     )
 
+def empieza_con_categoria(texto):
+    """Indica si el texto empieza con una clave de CATEGORIAS"""
+    return texto.strip().split(' ', 1)[0].lower() in CATEGORIAS
+
+def parsear_gastos(texto, categoria_por_defecto=None):
+    """Interpreta un mensaje con un gasto por línea: [categoría] monto descripción"""
+    gastos = []
+    errores = []
+    
+    for numero, linea in enumerate(texto.splitlines(), 1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        
+        partes = linea.split(' ', 1)
+        categoria = categoria_por_defecto
+        if partes[0].lower() in CATEGORIAS:
+            categoria = partes[0].lower()
+            partes = partes[1].strip().split(' ', 1) if len(partes) > 1 else ['']
+        
+        if categoria is None:
+            errores.append((numero, linea, "falta la categoría"))
+            continue
+        
+        try:
+            monto = float(partes[0].replace(',', ''))
+        except ValueError:
+            errores.append((numero, linea, "monto inválido"))
+            continue
+        
+        if not math.isfinite(monto) or monto <= 0:
+            errores.append((numero, linea, "el monto debe ser mayor que cero"))
+            continue
+        
+        descripcion = partes[1] if len(partes) > 1 else ""
+        gastos.append((categoria, monto, descripcion))
+    
+    return gastos, errores
+
 async def procesar_gasto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Procesa el gasto ingresado por el usuario"""
-    if 'categoria' not in context.user_data:
+    """Procesa uno o varios gastos ingresados por el usuario, uno por línea"""
+    texto = update.message.text.strip()
+    varias_lineas = '\n' in texto
+    
+    if 'categoria' not in context.user_data and not varias_lineas and not empieza_con_categoria(texto):
         await update.message.reply_text(
             "Primero selecciona una categoría usando 'Agregar Gasto'"
         )
         return
     
-    try:
-        texto = update.message.text.strip()
-        partes = texto.split(' ', 1)
-        
-        monto = float(partes[0].replace(',', ''))
-        descripcion = partes[1] if len(partes) > 1 else ""
-        
-        categoria = context.user_data['categoria']
-        user_id = update.effective_user.id
-        
-        expense_bot.agregar_gasto(user_id, categoria, monto, descripcion)
-        
+    gastos, errores = parsear_gastos(texto, context.user_data.get('categoria'))
+    
+    if not gastos and not varias_lineas:
+        _, _, motivo = errores[0]
+        await update.message.reply_text(
+            f"❌ Formato incorrecto ({motivo}). Usa: monto descripción\n"
+            "Ejemplo: 50000 hamburguesa"
+        )
+        return
+    
+    user_id = update.effective_user.id
+    if gastos:
+        # Un solo commit para todo el mensaje
+        expense_bot.agregar_gastos(user_id, gastos)
+    
+    if len(gastos) == 1 and not errores:
+        categoria, monto, descripcion = gastos[0]
         respuesta = f"✅ Gasto registrado:\n"
         respuesta += f"📂 {CATEGORIAS[categoria]}\n"
         respuesta += f"💰 ${monto:,.0f}\n"
         respuesta += f"📝 {descripcion or 'Sin descripción'}"
-        
         await update.message.reply_text(respuesta)
         context.user_data.clear()
-        
-    except (ValueError, IndexError):
-        await update.message.reply_text(
-            "❌ Formato incorrecto. Usa: monto descripción\n"
-            "Ejemplo: 50000 hamburguesa"
-        )
+        return
+    
+    bloques = [
+        f"• {CATEGORIAS[categoria]}: ${monto:,.0f} - {descripcion or 'Sin descripción'}\n"
+        for categoria, monto, descripcion in gastos
+    ]
+    if gastos:
+        bloques.append(f"\n💰 Total: ${sum(monto for _, monto, _ in gastos):,.0f}\n")
+    
+    if errores:
+        bloques.append(f"\n❌ Líneas con error: {len(errores)}\n")
+        bloques.extend(f"• Línea {numero}: {linea} ({motivo})\n" for numero, linea, motivo in errores)
+        bloques.append("\nFormato por línea: [categoría] monto descripción\n")
+    
+    encabezado = f"✅ Gastos registrados: {len(gastos)}\n\n" if gastos else "No se registró ningún gasto.\n\n"
+    # Una sola respuesta salvo que supere el límite de Telegram
+    for pagina in paginar(bloques, encabezado):
+        await update.message.reply_text(pagina)
+    
+    if gastos:
+        context.user_data.clear()
 
 async def nuevo_recurrente(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Comando para crear nuevo gasto recurrente"""
@@ -709,14 +1040,83 @@ async def manejar_texto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         except ValueError:
             await update.message.reply_text("Ingresa un número válido")
     else:
-        # Si hay una categoría seleccionada, procesar como gasto
-        if 'categoria' in context.user_data:
+        # Si hay una categoría seleccionada, varias líneas o el texto empieza
+        # con una categoría, procesar como gasto(s)
+        if 'categoria' in context.user_data or '\n' in texto.strip() or empieza_con_categoria(texto):
             await procesar_gasto(update, context)
         else:
             await update.message.reply_text(
                 "Usa los botones del menú para interactuar conmigo"
             )
 
+async def backup_manual(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Comando /backup para crear un respaldo inmediato"""
+    if not es_admin(update.effective_user.id):
+        await update.message.reply_text("No tienes permiso para usar este comando")
+        return
+    
+    try:
+        ruta = await asyncio.to_thread(expense_bot.crear_backup)
+        await update.message.reply_text(f"✅ Respaldo creado: {os.path.basename(ruta)}")
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error creando respaldo: {e}")
+        await update.message.reply_text("❌ No se pudo crear el respaldo")
+
+async def restaurar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Comando /restaurar <archivo> para restaurar un respaldo"""
+    if not es_admin(update.effective_user.id):
+        await update.message.reply_text("No tienes permiso para usar este comando")
+        return
+    
+    if not context.args:
+        backups = expense_bot.listar_backups()
+        mensaje = "Respaldos disponibles:\n\n"
+        if backups:
+            mensaje += "\n".join(f"• {nombre}" for nombre in backups)
+        else:
+            mensaje += "No hay respaldos."
+        mensaje += "\n\nUso: /restaurar <archivo>"
+        await update.message.reply_text(mensaje)
+        return
+    
+    nombre = context.args[0]
+    try:
+        respaldo_previo = await asyncio.to_thread(expense_bot.restaurar_backup, nombre)
+        await update.message.reply_text(
+            f"✅ Base de datos restaurada desde {nombre}\n"
+            f"Respaldo previo: {os.path.basename(respaldo_previo)}"
+        )
+    except FileNotFoundError:
+        await update.message.reply_text(f"❌ No existe el respaldo {nombre}")
+    except RestauracionCanceladaError as e:
+        logger.error(f"Restauración de {nombre} cancelada, falló el respaldo previo: {e}")
+        await update.message.reply_text(
+            "❌ Restauración cancelada: no se pudo crear el respaldo previo. "
+            "La base de datos no se modificó."
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error restaurando respaldo {nombre}: {e}")
+        await update.message.reply_text("❌ No se pudo restaurar el respaldo")
+
+async def job_backup(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tarea programada que crea respaldos periódicos"""
+    try:
+        ruta = await asyncio.to_thread(expense_bot.crear_backup)
+        logger.info(f"Respaldo programado creado: {ruta}")
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error en respaldo programado: {e}")
+
+def registrar_handlers(application):
+    """Registra los handlers del bot en la aplicación"""
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("nuevo_recurrente", procesar_nuevo_recurrente))
+    application.add_handler(CommandHandler("backup", backup_manual))
+    application.add_handler(CommandHandler("restaurar", restaurar))
+    application.add_handler(CallbackQueryHandler(callback_presupuesto_categoria, pattern='^presup_cat_'))
+    application.add_handler(CallbackQueryHandler(callback_categoria, pattern='^categoria_'))
+    application.add_handler(CallbackQueryHandler(callback_pagina, pattern='^pag_'))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, manejar_texto))
+
 def main():
     """Función principal"""
     TOKEN = os.environ.get('TOKEN')
@@ -725,11 +1125,13 @@ def main():
     application = Application.builder().token(TOKEN).build()
     
     # Agregar handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("nuevo_recurrente", procesar_nuevo_recurrente))
-    application.add_handler(CallbackQueryHandler(callback_presupuesto_categoria, pattern='^presup_cat_'))
-    application.add_handler(CallbackQueryHandler(callback_categoria, pattern='^categoria_'))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, manejar_texto))
+    registrar_handlers(application)
+    
+    # Respaldos periódicos
+    if application.job_queue:
+        application.job_queue.run_repeating(job_backup, interval=timedelta(hours=BACKUP_INTERVALO_HORAS), first=60)
+    else:
+        logger.warning("JobQueue no disponible: instala python-telegram-bot[job-queue] para respaldos automáticos")
     
     print("Bot de gastos avanzado iniciado...")
     application.run_polling()
@@ -0,0 +1,413 @@
+"""Prueba de carga de extremo a extremo contra una Bot API de Telegram falsa.
+
+Levanta un servidor HTTP local que imita api.telegram.org, ejecuta el bot con
+los handlers sin modificar apuntando a ese servidor y simula miles de usuarios
+concurrentes que usan el teclado del menú, los flujos de callback y
+/nuevo_recurrente.
+
+Uso: python loadtest.py --usuarios 2000 --duracion 60
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+TOKEN = '123456:LOADTEST'
+
+CATEGORIAS_PRUEBA = ['alimentacion', 'vivienda', 'transporte', 'salud', 'ropa', 'otros']
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class ServidorBotFalso:
+    """Servidor HTTP mínimo que responde a los métodos de la Bot API usados por el bot"""
+
+    def __init__(self):
+        self.pendientes = []
+        self.hay_updates = asyncio.Event()
+        self.respuestas = defaultdict(asyncio.Queue)
+        self.ids_update = itertools.count(1)
+        self.ids_mensaje = itertools.count(1)
+        self.ids_callback = itertools.count(1)
+        self.llamadas = defaultdict(int)
+        self.cerrado = False
+
+    # --- Construcción de updates -------------------------------------------
+
+    def _usuario(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'usuario{user_id}'}
+
+    def _mensaje(self, chat_id, texto, desde=None):
+        mensaje = {
+            'message_id': next(self.ids_mensaje),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': texto,
+        }
+        if desde is not None:
+            mensaje['from'] = desde
+        return mensaje
+
+    def enviar_texto(self, user_id, texto):
+        """Encola un mensaje de texto (o comando) como si lo enviara el usuario"""
+        mensaje = self._mensaje(user_id, texto, self._usuario(user_id))
+        if texto.startswith('/'):
+            comando = texto.split(' ', 1)[0]
+            mensaje['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(comando)}]
+        self._encolar({'message': mensaje})
+
+    def enviar_callback(self, user_id, data):
+        """Encola la pulsación de un botón inline"""
+        self._encolar({
+            'callback_query': {
+                'id': str(next(self.ids_callback)),
+                'from': self._usuario(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': self._mensaje(user_id, 'menú'),
+            }
+        })
+
+    def _encolar(self, update):
+        update['update_id'] = next(self.ids_update)
+        self.pendientes.append(update)
+        self.hay_updates.set()
+
+    # --- Métodos de la Bot API ---------------------------------------------
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset', 0) or 0)
+        limite = int(params.get('limit', 100) or 100)
+        espera = float(params.get('timeout', 0) or 0)
+
+        self.pendientes = [u for u in self.pendientes if u['update_id'] >= offset]
+        if not self.pendientes and espera > 0 and not self.cerrado:
+            self.hay_updates.clear()
+            try:
+                await asyncio.wait_for(self.hay_updates.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+        return self.pendientes[:limite]
+
+    def cerrar(self):
+        """Libera el long polling pendiente para que el bot pueda detenerse"""
+        self.cerrado = True
+        self.hay_updates.set()
+
+    def _respuesta_bot(self, params):
+        chat_id = int(params['chat_id'])
+        mensaje = self._mensaje(chat_id, params.get('text', ''))
+        self.respuestas[chat_id].put_nowait((time.perf_counter(), params.get('text', '')))
+        return mensaje
+
+    async def despachar(self, metodo, params):
+        self.llamadas[metodo] += 1
+        if metodo == 'getUpdates':
+            return await self._get_updates(params)
+        if metodo == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Bot de carga', 'username': 'loadtest_bot'}
+        if metodo in ('sendMessage', 'editMessageText'):
+            return self._respuesta_bot(params)
+        return True
+
+    # --- HTTP ----------------------------------------------------------------
+
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                _, ruta, _ = linea.decode().split(' ', 2)
+
+                cabeceras = {}
+                while True:
+                    cabecera = await reader.readline()
+                    if cabecera in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, valor = cabecera.decode().split(':', 1)
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+
+                cuerpo = await reader.readexactly(int(cabeceras.get('content-length', 0)))
+                if cabeceras.get('content-type', '').startswith('application/json'):
+                    params = json.loads(cuerpo or b'{}')
+                else:
+                    params = {k: v[0] for k, v in parse_qs(cuerpo.decode()).items()}
+
+                resultado = await self.despachar(ruta.rsplit('/', 1)[-1], params)
+                datos = json.dumps({'ok': True, 'result': resultado}).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    + f'Content-Length: {len(datos)}\r\n\r\n'.encode()
+                    + datos
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class Metricas:
+    """Acumula latencias de respuesta y uso de la base de datos"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.sin_respuesta = 0
+        self.updates = 0
+        self.errores_handler = 0
+        self.bloqueos_bd = 0
+        # Llamadas hechas en el hilo del event loop (bloquean a los handlers)
+        self.tiempos_bd = defaultdict(list)
+        # Llamadas desde asyncio.to_thread, como los respaldos
+        self.tiempos_bd_hilos = defaultdict(list)
+        self.hilo_loop = threading.get_ident()
+        self.lock = threading.Lock()
+
+    def registrar_bd(self, metodo, segundos):
+        destino = self.tiempos_bd if threading.get_ident() == self.hilo_loop else self.tiempos_bd_hilos
+        with self.lock:
+            destino[metodo].append(segundos)
+
+
+def instrumentar_bd(expense_bot, metricas):
+    """Envuelve los métodos de AdvancedExpenseBot para medir tiempo y bloqueos"""
+    from bot import AdvancedExpenseBot
+
+    for nombre, atributo in vars(AdvancedExpenseBot).items():
+        if nombre.startswith('_') or nombre in ('init_db', 'version_datos') or not callable(atributo):
+            continue
+
+        def envoltura(*args, _original=getattr(expense_bot, nombre), _nombre=nombre, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if 'locked' in str(e):
+                    with metricas.lock:
+                        metricas.bloqueos_bd += 1
+                raise
+            finally:
+                metricas.registrar_bd(_nombre, time.perf_counter() - inicio)
+
+        setattr(expense_bot, nombre, envoltura)
+
+
+class UsuarioSimulado:
+    """Usuario que recorre los flujos del bot esperando cada respuesta"""
+
+    def __init__(self, user_id, servidor, metricas, espera_respuesta, pausa):
+        self.user_id = user_id
+        self.servidor = servidor
+        self.metricas = metricas
+        self.espera_respuesta = espera_respuesta
+        self.pausa = pausa
+
+    async def _paso(self, accion, enviar, *args):
+        respuestas = self.servidor.respuestas[self.user_id]
+        # Descartar respuestas tardías de pasos que expiraron
+        while not respuestas.empty():
+            respuestas.get_nowait()
+
+        inicio = time.perf_counter()
+        enviar(self.user_id, *args)
+        self.metricas.updates += 1
+        try:
+            momento, _ = await asyncio.wait_for(respuestas.get(), self.espera_respuesta)
+        except asyncio.TimeoutError:
+            self.metricas.sin_respuesta += 1
+            return False
+        self.metricas.latencias[accion].append(momento - inicio)
+        return True
+
+    async def texto(self, accion, texto):
+        return await self._paso(accion, self.servidor.enviar_texto, texto)
+
+    async def callback(self, accion, data):
+        return await self._paso(accion, self.servidor.enviar_callback, data)
+
+    async def flujo_agregar_gasto(self):
+        categoria = random.choice(CATEGORIAS_PRUEBA)
+        return (
+            await self.texto('boton_agregar_gasto', "🛒 Agregar Gasto")
+            and await self.callback('callback_categoria', f'categoria_{categoria}')
+            and await self.texto('procesar_gasto', f"{random.randint(1, 200) * 500} gasto de carga")
+        )
+
+    async def flujo_presupuesto_categoria(self):
+        categoria = random.choice(CATEGORIAS_PRUEBA)
+        return (
+            await self.texto('boton_presupuesto_categoria', "🎯 Presupuesto por Categoría")
+            and await self.callback('callback_presupuesto_categoria', f'presup_cat_{categoria}')
+            and await self.texto('monto_presupuesto_categoria', str(random.randint(10, 500) * 1000))
+        )
+
+    async def flujo_presupuesto_general(self):
+        return (
+            await self.texto('boton_presupuesto_general', "💰 Presupuesto General")
+            and await self.texto('monto_presupuesto_general', str(random.randint(100, 5000) * 1000))
+        )
+
+    async def flujo_nuevo_recurrente(self):
+        categoria = random.choice(CATEGORIAS_PRUEBA)
+        return await self.texto(
+            'nuevo_recurrente',
+            f"/nuevo_recurrente {categoria} {random.randint(1, 28)} {random.randint(1, 100) * 1000} Pago de carga"
+        )
+
+    async def ejecutar(self, hasta):
+        flujos = [
+            (self.flujo_agregar_gasto, 40),
+            (lambda: self.texto('boton_estado_detallado', "📊 Estado Detallado"), 15),
+            (lambda: self.texto('boton_recurrentes', "🔄 Gastos Recurrentes"), 10),
+            (lambda: self.texto('boton_analisis', "📈 Análisis y Tendencias"), 10),
+            (self.flujo_presupuesto_categoria, 10),
+            (self.flujo_presupuesto_general, 5),
+            (self.flujo_nuevo_recurrente, 5),
+            (lambda: self.texto('start', "/start"), 5),
+        ]
+        acciones, pesos = zip(*flujos)
+
+        await self.texto('start', "/start")
+        while time.perf_counter() < hasta:
+            await random.choices(acciones, pesos)[0]()
+            await asyncio.sleep(random.uniform(0, self.pausa))
+
+
+async def respaldos_periodicos(expense_bot, directorio, intervalo, detener):
+    """Ejecuta respaldos en segundo plano para medir su efecto sobre la carga"""
+    while not detener.is_set():
+        try:
+            await asyncio.wait_for(detener.wait(), intervalo)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(expense_bot.crear_backup, directorio, 2)
+
+
+def reportar(metricas, duracion, servidor):
+    todas = [latencia for valores in metricas.latencias.values() for latencia in valores]
+    respondidas = len(todas)
+
+    print(f"\nDuración: {duracion:.1f}s")
+    print(f"Updates enviados: {metricas.updates} ({metricas.updates / duracion:.1f} updates/s)")
+    print(f"Respuestas: {respondidas} ({respondidas / duracion:.1f}/s), sin respuesta: {metricas.sin_respuesta}")
+    print(f"Errores en handlers: {metricas.errores_handler}")
+    print(f"Latencia de respuesta: p50={percentil(todas, 50) * 1000:.1f}ms  p99={percentil(todas, 99) * 1000:.1f}ms")
+
+    print("\nPor acción:")
+    for accion, valores in sorted(metricas.latencias.items()):
+        print(f"  {accion:<32} n={len(valores):<7} p50={percentil(valores, 50) * 1000:8.1f}ms  p99={percentil(valores, 99) * 1000:8.1f}ms")
+
+    tiempos = [t for valores in metricas.tiempos_bd.values() for t in valores]
+    print("\nBase de datos:")
+    print(f"  Llamadas en el event loop: {len(tiempos)}, bloqueos (database is locked): {metricas.bloqueos_bd}")
+    if tiempos:
+        print(f"  Tiempo por llamada: media={statistics.mean(tiempos) * 1000:.2f}ms  p99={percentil(tiempos, 99) * 1000:.2f}ms")
+        print(f"  Ocupación del event loop por la BD: {sum(tiempos) / duracion * 100:.1f}%")
+    for metodo, valores in sorted(metricas.tiempos_bd.items()):
+        print(f"  {metodo:<40} n={len(valores):<7} p99={percentil(valores, 99) * 1000:.2f}ms")
+
+    if metricas.tiempos_bd_hilos:
+        print("\nEn segundo plano (fuera del event loop):")
+        for metodo, valores in sorted(metricas.tiempos_bd_hilos.items()):
+            print(f"  {metodo:<40} n={len(valores):<7} total={sum(valores):.2f}s  max={max(valores) * 1000:.1f}ms")
+
+    print("\nLlamadas a la Bot API:", dict(servidor.llamadas))
+
+
+async def ejecutar_prueba(args):
+    # La base de prueba se define antes de importar el bot para no tocar la real
+    os.environ['DB_PATH'] = os.path.join(args.directorio, 'loadtest.db')
+    import bot
+    from telegram import Update
+    from telegram.ext import Application
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    metricas = Metricas()
+    instrumentar_bd(bot.expense_bot, metricas)
+
+    servidor = ServidorBotFalso()
+    http = await asyncio.start_server(servidor.atender, '127.0.0.1', args.puerto)
+    puerto = http.sockets[0].getsockname()[1]
+
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f'http://127.0.0.1:{puerto}/bot')
+        .concurrent_updates(args.concurrentes if args.concurrentes > 1 else False)
+        .pool_timeout(args.espera_respuesta)
+        .build()
+    )
+    bot.registrar_handlers(application)
+
+    async def contar_error(update: object, context) -> None:
+        metricas.errores_handler += 1
+
+    application.add_error_handler(contar_error)
+
+    detener = asyncio.Event()
+    async with http, application:
+        await application.start()
+        await application.updater.start_polling(poll_interval=0, timeout=10, allowed_updates=Update.ALL_TYPES)
+
+        tarea_respaldos = None
+        if args.respaldo_cada:
+            tarea_respaldos = asyncio.create_task(respaldos_periodicos(
+                bot.expense_bot, os.path.join(args.directorio, 'backups'), args.respaldo_cada, detener
+            ))
+
+        inicio = time.perf_counter()
+        hasta = inicio + args.duracion
+        usuarios = []
+        for user_id in range(1, args.usuarios + 1):
+            usuario = UsuarioSimulado(user_id, servidor, metricas, args.espera_respuesta, args.pausa)
+            usuarios.append(asyncio.create_task(usuario.ejecutar(hasta)))
+            if args.rampa:
+                await asyncio.sleep(args.rampa / args.usuarios)
+        await asyncio.gather(*usuarios)
+        duracion = time.perf_counter() - inicio
+
+        detener.set()
+        if tarea_respaldos:
+            await tarea_respaldos
+        servidor.cerrar()
+        await application.updater.stop()
+        await application.stop()
+
+    reportar(metricas, duracion, servidor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=1000, help='usuarios simulados concurrentes')
+    parser.add_argument('--duracion', type=float, default=30, help='segundos de carga')
+    parser.add_argument('--rampa', type=float, default=5, help='segundos para arrancar a todos los usuarios')
+    parser.add_argument('--pausa', type=float, default=1.0, help='pausa máxima entre acciones de un usuario')
+    parser.add_argument('--espera-respuesta', type=float, default=30, help='segundos antes de dar una respuesta por perdida')
+    parser.add_argument('--concurrentes', type=int, default=1, help='updates procesados en paralelo por la aplicación')
+    parser.add_argument('--respaldo-cada', type=float, default=0, help='crear respaldos cada N segundos durante la prueba')
+    parser.add_argument('--puerto', type=int, default=0, help='puerto del servidor falso (0 = libre)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        args.directorio = directorio
+        asyncio.run(ejecutar_prueba(args))
+
+
+if __name__ == '__main__':
+    main()